@@ -2,15 +2,20 @@
 # coding: utf-8
 
 import requests
-from bs4 import BeautifulSoup
-from ics import Calendar, Event
+from requests.adapters import HTTPAdapter
+from lxml import etree, html
 from datetime import datetime, timedelta, date
+from email.utils import parsedate_to_datetime
 import re
 import json
+import hashlib
 import os
 import time
 import random
-from urllib.parse import urljoin, quote, urlparse, parse_qs
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urljoin, quote, urlparse, parse_qs, urldefrag
 import argparse
 import logging
 
@@ -31,7 +36,88 @@ BACKOFF_FACTOR = 5
 BASE_DELAY = 5               
 RANDOM_DELAY = 3             
 PAGE_DELAY = 8               
-DETAIL_DELAY = 12            
+DETAIL_WORKERS = 8           # Параллельные загрузки страниц фильмов
+REQUESTS_PER_SECOND = 2      # Лимит запросов к www.afisha.ru
+CACHE_DIR = '.cache/pages'   # Дисковый кэш страниц фильмов
+CACHE_TTL_HOURS = 6          # Время жизни кэша (0 - кэш отключен)
+
+# Ссылки пагинации вида .../page3/
+PAGE_LINK_RE = re.compile(r'/page(\d+)/')
+
+# Время сеанса: 19:30 или 19.30, диапазон часов и минут проверяется самим паттерном
+TIME_RE = re.compile(r'(?<!\d)([01]?\d|2[0-3])[:.]([0-5]\d)(?!\d)')
+
+# Дата в aria-label календаря сеансов: "5 ноября, среда"
+ARIA_DATE_RE = re.compile(r'(\d{1,2})\s+([а-яё]+)', re.I)
+
+MONTH_RU = {
+    'января': 1, 'февраля': 2, 'марта': 3, 'апреля': 4, 'мая': 5, 'июня': 6,
+    'июля': 7, 'августа': 8, 'сентября': 9, 'октября': 10, 'ноября': 11, 'декабря': 12
+}
+
+# Заголовок блока "О фильме"
+ABOUT_MOVIE_RE = re.compile(r'О фильме', re.I)
+
+# Паттерны для поиска возрастного рейтинга
+AGE_RATING_PATTERNS = [
+    re.compile(r'(\d+\+)', re.I),  # 12+, 16+, 18+
+    re.compile(r'(\d+ лет\+)', re.I),  # 12 лет+
+    re.compile(r'(без ограничений)', re.I),
+    re.compile(r'(0\+)', re.I),
+    re.compile(r'(6\+)', re.I),
+    re.compile(r'(12\+)', re.I),
+    re.compile(r'(16\+)', re.I),
+    re.compile(r'(18\+)', re.I)
+]
+
+def xpath_class(*names):
+    """
+    XPath-условие: у элемента есть все перечисленные CSS-классы
+    """
+    return ' and '.join(f"contains(concat(' ', normalize-space(@class), ' '), ' {name} ')" for name in names)
+
+# Предкомпилированные XPath для горячих путей: карточки списка, пагинация, календарь сеансов
+CARD_XPATH = etree.XPath(
+    f'//*[{xpath_class("oP17O")}]'                           # Класс карточки (включая div.oP17O[role="listitem"])
+    ' | //div[@data-test="ITEM"]'                            # Альтернативный селектор из data-test
+)
+CARD_TITLE_XPATH = etree.XPath(
+    './/a[contains(@data-test, "ITEM-NAME")]'                # data-test="LINK ITEM-NAME ITEM-URL" и частичные совпадения
+    f' | .//a[{xpath_class("CjnHd", "y8A5E", "nbCNS", "yknrM")}]'  # Полный класс из примера
+)
+CARD_TITLE_FALLBACK_XPATH = etree.XPath(
+    f'.//*[{xpath_class("QWR1k")}]//a'                       # Ссылка в информационном блоке
+    ' | .//a[contains(@href, "/movie/")]'                    # Ссылка на страницу фильма
+)
+CARD_META_XPATH = etree.XPath(
+    './/div[@data-test="ITEM-META"]'                         # Основной селектор метаданных
+    f' | .//*[{xpath_class("S_wwn")}]'                       # Класс из примера (включая .QWR1k .S_wwn)
+)
+CARD_COUNTRY_XPATH = etree.XPath(
+    f'.//*[@data-test="meta-country" or @data-test="ITEM-COUNTRY" or {xpath_class("country")}]'
+)
+CARD_TIME_XPATH = etree.XPath(
+    f'.//*[@data-time or self::time or {xpath_class("time")} or {xpath_class("session-time")}]'
+)
+CARD_RATING_XPATH = etree.XPath(
+    './/div[@data-test="RATING"]'                            # Селектор рейтинга
+    f' | .//*[{xpath_class("IrSqF", "zPI3b", "BNjPz", "k96pX")}]'  # Классы рейтинга из примера
+)
+CARD_IMAGE_XPATH = etree.XPath(
+    './/img[@data-test="IMAGE ITEM-IMAGE"]'                  # Основной селектор изображения
+    ' | .//picture//img'                                     # Изображение в picture элементе
+    ' | .//img[contains(@src, "mediastorage")]'              # Изображения с mediastorage
+)
+NEXT_PAGE_XPATH = etree.XPath('//a[@rel="next"] | //link[@rel="next"]')
+PAGE_HREFS_XPATH = etree.XPath('//a[contains(@href, "/page")]/@href')
+CALENDAR_XPATHS = [
+    ('.EyErB', etree.XPath(f'//*[{xpath_class("EyErB")}]')),  # основной класс календаря из примера
+    ('[aria-label="Календарь"]', etree.XPath('//*[@aria-label="Календарь"]')),
+    ('.calendar', etree.XPath(f'//*[{xpath_class("calendar")}]')),
+    ('.schedule-calendar', etree.XPath(f'//*[{xpath_class("schedule-calendar")}]'))
+]
+CALENDAR_DATE_LINKS_XPATH = etree.XPath(f'.//a[{xpath_class("pdT6c")}]')
+CALENDAR_DAY_XPATH = etree.XPath(f'.//*[{xpath_class("YCVqY")}]')
 
 # Страны, фильмы которых НЕ включать в календарь
 EXCLUDE_COUNTRIES = ['Россия']
@@ -67,6 +153,23 @@ parser.add_argument(
     action='store_true',
     help='Пропустить получение детальной информации о фильмах (быстрее, но без стран)'
 )
+parser.add_argument(
+    '--workers',
+    type=int,
+    default=DETAIL_WORKERS,
+    help='Число параллельных загрузок страниц фильмов (1 - последовательно)'
+)
+parser.add_argument(
+    '--cache-ttl',
+    type=int,
+    default=CACHE_TTL_HOURS,
+    help='Время жизни дискового кэша страниц фильмов в часах (0 - не использовать кэш)'
+)
+parser.add_argument(
+    '--cache-dir',
+    default=CACHE_DIR,
+    help='Каталог дискового кэша страниц фильмов'
+)
 args = parser.parse_args()
 
 # Используем аргументы, если они переданы
@@ -80,6 +183,9 @@ MAX_PAGES = args.max_pages    # None по умолчанию
 if args.delay:
     BASE_DELAY = args.delay
 SKIP_DETAILS = args.skip_details
+DETAIL_WORKERS = max(1, args.workers)
+CACHE_TTL_HOURS = args.cache_ttl
+CACHE_DIR = args.cache_dir
 
 # Логирование настроек
 if MAX_MOVIES:
@@ -98,7 +204,6 @@ def smart_delay(request_type='default'):
     """
     delays = {
         'default': BASE_DELAY,
-        'detail': DETAIL_DELAY,
         'page': PAGE_DELAY,
         'retry': BASE_DELAY * 2
     }
@@ -109,27 +214,164 @@ def smart_delay(request_type='default'):
     time.sleep(actual_delay)
     logger.debug(f"Задержка {request_type}: {actual_delay:.2f} сек")
 
-def get_soup(url, retries=MAX_RETRIES, request_type='default'):
-    """
-    Получить объект BeautifulSoup по URL с улучшенной обработкой HTTP 429
-    """
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/118.0.0.0 Safari/537.36',
-        'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8',
-        'Accept-Language': 'ru-RU,ru;q=0.9,en-US;q=0.8,en;q=0.7',
-        'Accept-Encoding': 'gzip, deflate, br',
-        'DNT': '1',
-        'Connection': 'keep-alive',
-        'Upgrade-Insecure-Requests': '1',
-        'Sec-Fetch-Dest': 'document',
-        'Sec-Fetch-Mode': 'navigate',
-        'Sec-Fetch-Site': 'none',
-        'Sec-Fetch-User': '?1',
-        'Cache-Control': 'max-age=0'
-    }
+class RateLimiter:
+    """
+    Потокобезопасный token bucket: ограничивает частоту запросов к хосту.
+    После HTTP 429 частота снижается вдвое и постепенно восстанавливается на успешных ответах
+    """
+    def __init__(self, rate, burst=1, min_rate=0.1):
+        self.rate = rate
+        self.max_rate = rate
+        self.min_rate = min_rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            # Токен резервируется сразу, ожидание - вне блокировки
+            self.tokens -= 1
+            wait_time = -self.tokens / self.rate if self.tokens < 0 else 0
+
+        if wait_time:
+            time.sleep(wait_time)
+
+    def slow_down(self):
+        with self.lock:
+            self.rate = max(self.min_rate, self.rate / 2)
+        logger.debug(f"Частота запросов снижена до {self.rate:.2f} в сек")
+
+    def speed_up(self):
+        with self.lock:
+            self.rate = min(self.max_rate, self.rate + self.max_rate * 0.1)
+
+    def pause(self, seconds):
+        """
+        Приостановить выдачу токенов всем потокам на seconds секунд
+        """
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens = min(self.tokens, -seconds * self.rate)
+
+    def update_from_headers(self, headers):
+        """
+        Притормозить заранее, если сервер сообщает об исчерпанном лимите (X-RateLimit-*)
+        """
+        try:
+            remaining = int(headers.get('X-RateLimit-Remaining', 1))
+            reset = float(headers.get('X-RateLimit-Reset', 1))
+        except ValueError:
+            return
+
+        if remaining > 0:
+            return
+
+        # Reset бывает как числом секунд, так и unix-временем
+        if reset > time.time() / 2:
+            reset -= time.time()
+        logger.debug(f"Лимит запросов исчерпан, пауза {reset:.1f} сек")
+        self.pause(max(0, reset))
+
+RATE_LIMITER = RateLimiter(REQUESTS_PER_SECOND)
+
+def retry_after_seconds(resp, default):
+    """
+    Время ожидания из заголовка Retry-After (секунды или HTTP-дата) или значение по умолчанию
+    """
+    retry_after = resp.headers.get('Retry-After')
+    if not retry_after:
+        return default
+
+    try:
+        return max(0, int(retry_after))
+    except ValueError:
+        pass
+
+    try:
+        retry_at = parsedate_to_datetime(retry_after)
+        return max(0, int(retry_at.timestamp() - time.time()))
+    except (TypeError, ValueError):
+        return default
+
+# Заголовки HTTP-запросов. Accept-Encoding не задаем: requests сам указывает только те
+# кодировки, которые умеет распаковать (br - при установленном brotli)
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/118.0.0.0 Safari/537.36',
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8',
+    'Accept-Language': 'ru-RU,ru;q=0.9,en-US;q=0.8,en;q=0.7',
+    'DNT': '1',
+    'Connection': 'keep-alive',
+    'Upgrade-Insecure-Requests': '1',
+    'Sec-Fetch-Dest': 'document',
+    'Sec-Fetch-Mode': 'navigate',
+    'Sec-Fetch-Site': 'none',
+    'Sec-Fetch-User': '?1',
+    'Cache-Control': 'max-age=0'
+}
+
+# Общая HTTP-сессия: keep-alive соединения к www.afisha.ru переиспользуются между запросами
+SESSION = requests.Session()
+SESSION.headers.update(HEADERS)
+# Пул не меньше числа потоков (--workers), иначе лишние соединения закрываются и keep-alive теряется
+SESSION.mount('https://', HTTPAdapter(pool_connections=1, pool_maxsize=max(DETAIL_WORKERS, 32), max_retries=0))
+
+def page_cache_path(url):
+    """
+    Путь к файлу кэша для URL (якорь #... в ключ не входит)
+    """
+    cache_key = hashlib.sha1(urldefrag(url)[0].encode('utf-8')).hexdigest()
+    return os.path.join(CACHE_DIR, f"{cache_key}.html")
+
+def read_page_cache(url):
+    """
+    Получить HTML страницы из дискового кэша, если он не устарел
+    """
+    if not CACHE_TTL_HOURS:
+        return None
+
+    path = page_cache_path(url)
+    try:
+        if time.time() - os.path.getmtime(path) > CACHE_TTL_HOURS * 3600:
+            return None
+        with open(path, 'rb') as f:
+            return f.read()
+    except OSError:
+        return None
+
+def write_page_cache(url, content):
+    """
+    Сохранить HTML страницы в дисковый кэш
+    """
+    if not CACHE_TTL_HOURS:
+        return
 
-    session = requests.Session()
-    session.headers.update(headers)
+    path = page_cache_path(url)
+    tmp_path = f"{path}.{threading.get_ident()}.tmp"
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        with open(tmp_path, 'wb') as f:
+            f.write(content)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        logger.debug(f"Не удалось сохранить кэш для {url[:60]}...: {e}")
+
+def fetch_page(url, retries=MAX_RETRIES, request_type='default'):
+    """
+    Получить HTML страницы (байты) по URL с улучшенной обработкой HTTP 429
+    """
+    # Страницы фильмов за день почти не меняются - берем из кэша без запроса и задержки
+    use_cache = request_type == 'detail'
+    if use_cache:
+        cached = read_page_cache(url)
+        if cached is not None:
+            logger.debug(f"Страница из кэша: {url[:60]}...")
+            return cached
 
     delay = BASE_DELAY
     for attempt in range(1, retries + 1):
@@ -139,29 +381,43 @@ def get_soup(url, retries=MAX_RETRIES, request_type='default'):
             if attempt > 1:
                 smart_delay('retry')
 
-            resp = session.get(url, timeout=45)
+            RATE_LIMITER.acquire()
+            resp = SESSION.get(url, timeout=45)
+            RATE_LIMITER.update_from_headers(resp.headers)
 
+            # Ожидание ставится на общий лимитер, чтобы притормозили все потоки
             if resp.status_code == 429:
-                wait_time = delay * BACKOFF_FACTOR
+                wait_time = retry_after_seconds(resp, delay * BACKOFF_FACTOR)
                 logger.warning(f"HTTP 429 для {url[:60]}... Ожидание {wait_time} сек (попытка {attempt})")
-                time.sleep(wait_time)
+                RATE_LIMITER.slow_down()
+                RATE_LIMITER.pause(wait_time)
+                delay *= BACKOFF_FACTOR
+                continue
+            elif resp.status_code == 503 and 'Retry-After' in resp.headers:
+                wait_time = retry_after_seconds(resp, delay * BACKOFF_FACTOR)
+                logger.warning(f"HTTP 503 для {url[:60]}... Ожидание {wait_time} сек (попытка {attempt})")
+                RATE_LIMITER.slow_down()
+                RATE_LIMITER.pause(wait_time)
                 delay *= BACKOFF_FACTOR
                 continue
             elif resp.status_code == 404:
                 logger.warning(f"Страница не найдена: {url[:60]}...")
                 return None
             elif resp.status_code == 403:
-                logger.warning(f"Доступ запрещен (403): {url[:60]}...")
-                time.sleep(delay * 2)
+                logger.warning(f"Доступ запрещен (403): {url[:60]}... Ожидание {delay * 2} сек (попытка {attempt})")
+                RATE_LIMITER.slow_down()
+                RATE_LIMITER.pause(delay * 2)
                 delay *= 2
                 continue
 
             resp.raise_for_status()
-            logger.debug(f"Успешный ответ для {url[:60]}... (статус: {resp.status_code})")
+            logger.debug(f"Успешный ответ для {url[:60]}... (статус: {resp.status_code}, сжатие: {resp.headers.get('Content-Encoding', 'нет')})")
+            RATE_LIMITER.speed_up()
 
-            smart_delay(request_type)
+            if use_cache:
+                write_page_cache(url, resp.content)
 
-            return BeautifulSoup(resp.text, 'html.parser')
+            return resp.content
 
         except requests.exceptions.Timeout:
             logger.warning(f"Таймаут для {url[:60]}... (попытка {attempt})")
@@ -179,55 +435,83 @@ def get_soup(url, retries=MAX_RETRIES, request_type='default'):
 
     return None
 
-def parse_schedule_calendar(soup):
+def parse_html(content):
+    """
+    Построить lxml-дерево из байтов страницы (afisha.ru отдает UTF-8)
+    """
+    try:
+        # Парсер создается на каждый вызов: экземпляры парсеров lxml нельзя делить между потоками
+        tree = html.document_fromstring(content, parser=html.HTMLParser(encoding='utf-8'))
+    except etree.ParserError as e:
+        logger.warning(f"Не удалось разобрать HTML: {e}")
+        return None
+
+    # text_content() включает текст <script>/<style> - убираем их, чтобы текстовые
+    # запасные поиски (возраст, сеансы) не находили совпадения в JS и JSON
+    etree.strip_elements(tree, 'script', 'style', with_tail=False)
+    return tree
+
+def get_tree(url, retries=MAX_RETRIES, request_type='default'):
+    """
+    Получить lxml-дерево страницы по URL (None, если страница недоступна)
+    """
+    content = fetch_page(url, retries=retries, request_type=request_type)
+    if content is None:
+        return None
+    return parse_html(content)
+
+def element_text(element):
+    """
+    Текст элемента со схлопнутыми пробелами и переносами строк
+    """
+    return ' '.join(element.text_content().split())
+
+def first(elements):
+    """
+    Первый элемент списка результатов XPath/CSS или None
+    """
+    return elements[0] if elements else None
+
+def parse_schedule_calendar(tree):
     """
     Парсить календарь расписания сеансов и найти ближайшую доступную дату
     """
     available_dates = []
 
     # Поиск календарного виджета
-    calendar_selectors = [
-        '.EyErB',  # основной класс календаря из примера
-        '[aria-label="Календарь"]',
-        '.calendar',
-        '.schedule-calendar'
-    ]
-
     calendar_widget = None
-    for selector in calendar_selectors:
-        calendar_widget = soup.select_one(selector)
-        if calendar_widget:
+    for selector, calendar_xpath in CALENDAR_XPATHS:
+        calendar_widget = first(calendar_xpath(tree))
+        if calendar_widget is not None:
             logger.debug(f"Найден календарь с селектором: {selector}")
             break
 
-    if not calendar_widget:
+    if calendar_widget is None:
         logger.debug("Календарь сеансов не найден")
         return None
 
     # Поиск активных дат (ссылки, не кнопки disabled)
-    date_links = calendar_widget.find_all('a', class_='pdT6c')
+    date_links = CALENDAR_DATE_LINKS_XPATH(calendar_widget)
+    today = date.today()
 
     for link in date_links:
         try:
-            aria_label = link.get('aria-label', '')
-            day_elem = link.select_one('.YCVqY')
-            if day_elem:
-                day_number = day_elem.get_text(strip=True)
-
-                # Определяем месяц и год из aria-label
-                if 'октября' in aria_label:
-                    month = 10
-                    year = 2025
-                elif 'ноября' in aria_label:
-                    month = 11
-                    year = 2025
-                elif 'декабря' in aria_label:
-                    month = 12
-                    year = 2025
-                else:
-                    now = datetime.now()
-                    month = now.month
-                    year = now.year
+            # День и месяц из aria-label одним поиском, иначе день из ячейки и текущий месяц
+            date_match = ARIA_DATE_RE.search(link.get('aria-label', ''))
+            month = MONTH_RU.get(date_match.group(2).lower()) if date_match else None
+            day_elem = first(CALENDAR_DAY_XPATH(link))
+
+            if month:
+                day_number = date_match.group(1)
+            elif day_elem is not None:
+                day_number = element_text(day_elem)
+                month = today.month
+            else:
+                continue
+
+            if day_number:
+                # Месяц сильно раньше текущего - это уже следующий год (расписание на январь в декабре)
+                year = today.year + 1 if month < today.month - 6 else today.year
 
                 try:
                     show_date = date(year, month, int(day_number))
@@ -250,11 +534,40 @@ def parse_schedule_calendar(soup):
     logger.debug("Не найдено доступных дат в календаре")
     return None
 
-def parse_showtimes_from_page(soup):
+def normalize_showtime(text):
+    """
+    Найти в строке время сеанса и привести к виду ЧЧ:ММ (None, если времени нет)
+    """
+    time_match = TIME_RE.search(text)
+    if not time_match:
+        return None
+    return f"{time_match.group(1)}:{time_match.group(2)}"
+
+def outermost_elements(elements):
+    """
+    Оставить только элементы, не вложенные в другие элементы того же списка (порядок документа)
+    """
+    result = []
+    seen = set()
+    for element in elements:
+        seen.add(element)
+        if not any(parent in seen for parent in element.iterancestors()):
+            result.append(element)
+    return result
+
+def showtime_sort_key(time_str):
+    """
+    Ключ сортировки времени сеанса по часам и минутам ('9:30' раньше '10:00')
+    """
+    hour, minute = time_str.split(':')
+    return int(hour), int(minute)
+
+def parse_showtimes_from_page(tree):
     """
     Парсить время сеансов со страницы расписания фильма
     """
     showtimes = []
+    seen = set()
 
     time_selectors = [
         '.showtime',
@@ -265,43 +578,29 @@ def parse_showtimes_from_page(soup):
     ]
 
     for selector in time_selectors:
-        time_elements = soup.select(selector)
+        time_elements = tree.cssselect(selector)
         for elem in time_elements:
-            time_text = elem.get_text(strip=True)
-            time_match = re.search(r'(\d{1,2}[:.]\d{2})', time_text)
-            if time_match:
-                time_str = time_match.group(1).replace('.', ':')
-                try:
-                    parsed_time = datetime.strptime(time_str, '%H:%M')
-                    if time_str not in showtimes:
-                        showtimes.append(time_str)
-                except ValueError:
-                    continue
+            # Атрибут data-time дешевле и точнее, чем текст элемента
+            time_str = normalize_showtime(elem.get('data-time') or element_text(elem))
+            if time_str and time_str not in seen:
+                seen.add(time_str)
+                showtimes.append(time_str)
 
+    # Запасной вариант: текст только блоков расписания, а не всей страницы
     if not showtimes:
-        page_text = soup.get_text()
-        time_patterns = [
-            r'(\d{1,2}:\d{2})',
-            r'(\d{1,2}\.\d{2})',
-            r'(\d{1,2}[:.]\d{2})'
-        ]
-
-        for pattern in time_patterns:
-            matches = re.findall(pattern, page_text)
-            for match in matches:
-                time_str = match.replace('.', ':')
-                try:
-                    parsed_time = datetime.strptime(time_str, '%H:%M')
-                    hour = parsed_time.hour
-                    if 6 <= hour <= 23:
-                        if time_str not in showtimes:
-                            showtimes.append(time_str)
-                except ValueError:
-                    continue
+        schedule_blocks = tree.cssselect('.schedule, .sessions, [class*="schedule"], [class*="session"]')
+        for block in outermost_elements(schedule_blocks):
+            # Текстовые узлы через пробел: text_content() склеил бы соседние сеансы в "10:0013:15"
+            block_text = ' '.join(text.strip() for text in block.itertext() if text.strip())
+            for hour, minute in TIME_RE.findall(block_text):
+                time_str = f"{hour}:{minute}"
+                if int(hour) >= 6 and time_str not in seen:
+                    seen.add(time_str)
+                    showtimes.append(time_str)
 
     return showtimes
 
-def parse_movie_banner(soup):
+def parse_movie_banner(tree):
     """
     Найти баннер/постер фильма
     """
@@ -318,8 +617,8 @@ def parse_movie_banner(soup):
     ]
 
     for selector in banner_selectors:
-        banner_elem = soup.select_one(selector)
-        if banner_elem:
+        banner_elem = first(tree.cssselect(selector))
+        if banner_elem is not None:
             # Получаем src или data-src
             banner_url = banner_elem.get('src') or banner_elem.get('data-src')
             if banner_url:
@@ -335,16 +634,11 @@ def parse_movie_banner(soup):
     logger.debug("Баннер не найден")
     return None
 
-def parse_movie_description(soup):
+def parse_movie_description(tree):
     """
     Найти описание фильма под заголовком "О фильме"
     """
     description_selectors = [
-        # Поиск заголовка "О фильме" и следующего за ним текста
-        'h2:contains("О фильме") + div',
-        'h3:contains("О фильме") + div',
-        'h2:contains("О фильме") + p',
-        'h3:contains("О фильме") + p',
         '.about-movie',
         '.movie-description',
         '.film-description',
@@ -355,25 +649,24 @@ def parse_movie_description(soup):
     ]
 
     # Сначала ищем по заголовку "О фильме"
-    about_headers = soup.find_all(['h1', 'h2', 'h3', 'h4'], string=re.compile(r'О фильме', re.I))
+    about_headers = tree.xpath('//h1 | //h2 | //h3 | //h4')
     for header in about_headers:
+        if not ABOUT_MOVIE_RE.search(header.text_content()):
+            continue
+
         # Ищем следующий элемент с текстом
-        next_elem = header.find_next_sibling(['div', 'p', 'section'])
-        if next_elem:
-            description = next_elem.get_text(strip=True)
+        next_elem = first(header.xpath('following-sibling::*[self::div or self::p or self::section][1]'))
+        if next_elem is not None:
+            description = element_text(next_elem)
             if description and len(description) > 20:
                 logger.debug(f"Найдено описание через заголовок: {description[:100]}...")
                 return description
 
     # Альтернативный поиск по селекторам
     for selector in description_selectors:
-        if ':contains(' in selector:
-            # Пропускаем CSS-селекторы с :contains, так как BeautifulSoup их не поддерживает
-            continue
-
-        desc_elem = soup.select_one(selector)
-        if desc_elem:
-            description = desc_elem.get_text(strip=True)
+        desc_elem = first(tree.cssselect(selector))
+        if desc_elem is not None:
+            description = element_text(desc_elem)
             if description and len(description) > 20:
                 logger.debug(f"Найдено описание через селектор {selector}: {description[:100]}...")
                 return description
@@ -381,22 +674,10 @@ def parse_movie_description(soup):
     logger.debug("Описание фильма не найдено")
     return None
 
-def parse_age_rating(soup):
+def parse_age_rating(tree):
     """
     Найти возрастной рейтинг фильма (например: 12+, 16+, 18+)
     """
-    # Паттерны для поиска возрастного рейтинга
-    age_patterns = [
-        r'(\d+\+)',  # 12+, 16+, 18+
-        r'(\d+ лет\+)',  # 12 лет+
-        r'(без ограничений)',
-        r'(0\+)',
-        r'(6\+)',
-        r'(12\+)',
-        r'(16\+)',
-        r'(18\+)'
-    ]
-
     # Селекторы для поиска возрастного рейтинга
     age_selectors = [
         '.age-rating',
@@ -411,20 +692,20 @@ def parse_age_rating(soup):
 
     # Поиск по селекторам
     for selector in age_selectors:
-        age_elem = soup.select_one(selector)
-        if age_elem:
-            age_text = age_elem.get_text(strip=True)
-            for pattern in age_patterns:
-                match = re.search(pattern, age_text, re.I)
+        age_elem = first(tree.cssselect(selector))
+        if age_elem is not None:
+            age_text = element_text(age_elem)
+            for pattern in AGE_RATING_PATTERNS:
+                match = pattern.search(age_text)
                 if match:
                     rating = match.group(1)
                     logger.debug(f"Найден возрастной рейтинг через селектор: {rating}")
                     return rating
 
     # Поиск по всему тексту страницы
-    page_text = soup.get_text()
-    for pattern in age_patterns:
-        matches = re.findall(pattern, page_text, re.I)
+    page_text = tree.text_content()
+    for pattern in AGE_RATING_PATTERNS:
+        matches = pattern.findall(page_text)
         for match in matches:
             # Проверяем, что это действительно возрастной рейтинг
             if any(age in match for age in ['0+', '6+', '12+', '16+', '18+', 'без ограничений']):
@@ -434,28 +715,18 @@ def parse_age_rating(soup):
     logger.debug("Возрастной рейтинг не найден")
     return None
 
-def extract_movie_data_from_schedule(soup):
+def extract_movie_data_from_schedule(tree):
     """
     Извлечь данные о фильмах ТОЛЬКО из карточек фильмов (ИСПРАВЛЕННАЯ ВЕРСИЯ)
     """
     movies_data = []
 
-    # Специфичные селекторы для карточек фильмов на afisha.ru
-    movie_card_selectors = [
-        'div.oP17O[role="listitem"]',  # Основной селектор из примера
-        'div[data-test="ITEM"]',      # Альтернативный селектор из data-test
-        '.oP17O',                     # Упрощенный селектор класса
-    ]
+    # Вложенные в уже найденную карточку совпадения пропускаем
+    movie_elements = outermost_elements(CARD_XPATH(tree))
 
-    movie_elements = []
-    for selector in movie_card_selectors:
-        elements = soup.select(selector)
-        if elements:
-            movie_elements = elements
-            logger.debug(f"Найдены элементы карточек с селектором: {selector} ({len(elements)} шт.)")
-            break
-
-    if not movie_elements:
+    if movie_elements:
+        logger.debug(f"Найдены элементы карточек: {len(movie_elements)} шт.")
+    else:
         logger.warning("❌ Карточки фильмов не найдены! Возможно, изменилась структура сайта.")
         return movies_data
 
@@ -463,86 +734,67 @@ def extract_movie_data_from_schedule(soup):
 
     for idx, card in enumerate(movie_elements, 1):
         try:
-            # Поиск названия фильма
-            title_selectors = [
-                'a[data-test="LINK ITEM-NAME ITEM-URL"]',     # Основной селектор названия
-                'a.CjnHd.y8A5E.nbCNS.yknrM',                 # Полный класс из примера
-                'a[data-test*="ITEM-NAME"]',                  # Частичное совпадение
-                '.QWR1k a',                                   # Ссылка в информационном блоке
-                'a[href*="/movie/"]'                          # Ссылка на страницу фильма
-            ]
-
+            # Поиск названия фильма: сначала точные селекторы, затем запасные
             title = None
             movie_url = None
 
-            for sel in title_selectors:
-                title_elem = card.select_one(sel)
-                if title_elem:
-                    title = title_elem.get_text(strip=True)
-                    # Получаем URL фильма
-                    movie_url = title_elem.get('href')
-                    if movie_url and not movie_url.startswith('http'):
-                        movie_url = 'https://www.afisha.ru' + movie_url
-                    break
+            title_elem = first(CARD_TITLE_XPATH(card) or CARD_TITLE_FALLBACK_XPATH(card))
+            if title_elem is not None:
+                title = element_text(title_elem)
+                # Получаем URL фильма
+                movie_url = title_elem.get('href')
+                if movie_url and not movie_url.startswith('http'):
+                    movie_url = 'https://www.afisha.ru' + movie_url
 
             if not title or len(title) < 2:
                 continue
 
             # Поиск метаданных (год, жанр)
             meta_info = []
-            meta_selectors = [
-                'div[data-test="ITEM-META"]',    # Основной селектор метаданных
-                '.S_wwn',                        # Класс из примера
-                '.QWR1k .S_wwn',                # Полный путь к метаданным
-            ]
-
-            for sel in meta_selectors:
-                meta_elem = card.select_one(sel)
-                if meta_elem:
-                    meta_text = meta_elem.get_text(strip=True)
-                    if meta_text:
-                        meta_info.append(meta_text)
-                    break
+            meta_elem = first(CARD_META_XPATH(card))
+            if meta_elem is not None:
+                meta_text = element_text(meta_elem)
+                if meta_text:
+                    meta_info.append(meta_text)
+
+            # Страны из карточки, если они показаны в списке - позволяют отсеять фильм до загрузки деталей
+            card_countries = []
+            for country_elem in CARD_COUNTRY_XPATH(card):
+                country_text = element_text(country_elem)
+                if country_text and country_text not in card_countries:
+                    card_countries.append(country_text)
+
+            # Время сеансов из карточки: сначала атрибуты, текст - только у самих элементов времени
+            card_times = []
+            for time_elem in CARD_TIME_XPATH(card):
+                time_str = normalize_showtime(time_elem.get('data-time') or time_elem.get('datetime') or element_text(time_elem))
+                if time_str and time_str not in card_times:
+                    card_times.append(time_str)
 
             # Поиск рейтинга
             rating = None
-            rating_selectors = [
-                'div[data-test="RATING"]',       # Селектор рейтинга
-                '.IrSqF.zPI3b.BNjPz.k96pX',     # Классы рейтинга из примера
-            ]
-
-            for sel in rating_selectors:
-                rating_elem = card.select_one(sel)
-                if rating_elem:
-                    rating_text = rating_elem.get_text(strip=True)
-                    try:
-                        rating = float(rating_text)
-                    except:
-                        rating = rating_text
-                    break
+            rating_elem = first(CARD_RATING_XPATH(card))
+            if rating_elem is not None:
+                rating_text = element_text(rating_elem)
+                try:
+                    rating = float(rating_text)
+                except:
+                    rating = rating_text
 
             # Поиск изображения/постера
             image_url = None
-            img_selectors = [
-                'img[data-test="IMAGE ITEM-IMAGE"]',  # Основной селектор изображения
-                'picture img',                        # Изображение в picture элементе
-                'img[src*="mediastorage"]',           # Изображения с mediastorage
-            ]
-
-            for sel in img_selectors:
-                img_elem = card.select_one(sel)
-                if img_elem:
-                    image_url = img_elem.get('src')
-                    if not image_url:
-                        image_url = img_elem.get('data-src')
-                    break
+            img_elem = first(CARD_IMAGE_XPATH(card))
+            if img_elem is not None:
+                image_url = img_elem.get('src')
+                if not image_url:
+                    image_url = img_elem.get('data-src')
 
             # Создание объекта данных о фильме
             movie_data = {
                 'title': title,
                 'url': movie_url,
-                'times': [],                # Заполняется позже при детальном парсинге
-                'countries': [],            # Заполняется позже при детальном парсинге
+                'times': card_times,        # Дополняется при детальном парсинге
+                'countries': card_countries,  # Уточняется при детальном парсинге
                 'nearest_show_date': None,
                 'banner_url': image_url,    # Используем найденное изображение
                 'description': None,
@@ -565,11 +817,30 @@ def extract_movie_data_from_schedule(soup):
     logger.debug(f"🎭 Извлечено {len(movies_data)} фильмов из карточек")
     return movies_data
 
+def has_next_page(tree, current_page):
+    """
+    Определить по пагинации текущей страницы, есть ли следующая (None - пагинация не найдена)
+    """
+    if NEXT_PAGE_XPATH(tree):
+        return True
+
+    page_numbers = []
+    for href in PAGE_HREFS_XPATH(tree):
+        match = PAGE_LINK_RE.search(href)
+        if match:
+            page_numbers.append(int(match.group(1)))
+
+    if not page_numbers:
+        return None
+
+    return max(page_numbers) > current_page
+
 def parse_all_schedule_pages(base_url):
     """
     Парсить все страницы расписания с учетом лимитов
     """
     all_movies_data = []
+    existing_titles = set()
     current_page = 1
 
     if MAX_PAGES:
@@ -591,13 +862,13 @@ def parse_all_schedule_pages(base_url):
 
         logger.info(f"📄 Парсинг страницы {current_page}: {page_url}")
 
-        soup = get_soup(page_url, request_type='page')
+        tree = get_tree(page_url, request_type='page')
 
-        if not soup:
+        if tree is None:
             logger.info(f"❌ Страница {current_page} недоступна (404) - завершаем парсинг")
             break
 
-        page_movies = extract_movie_data_from_schedule(soup)
+        page_movies = extract_movie_data_from_schedule(tree)
 
         if not page_movies:
             logger.info(f"❌ На странице {current_page} не найдено фильмов - завершаем парсинг")
@@ -607,7 +878,6 @@ def parse_all_schedule_pages(base_url):
 
         # Добавляем фильмы, избегая дубликатов
         new_movies_count = 0
-        existing_titles = {movie['title'] for movie in all_movies_data}
 
         for movie in page_movies:
             if movie['title'] not in existing_titles:
@@ -623,6 +893,12 @@ def parse_all_schedule_pages(base_url):
 
         logger.info(f"➕ Добавлено {new_movies_count} новых фильмов (всего: {len(all_movies_data)})")
 
+        # Если пагинация есть и в ней нет следующей страницы - не запрашиваем ее
+        if has_next_page(tree, current_page) is False:
+            logger.info(f"🏁 Страница {current_page} последняя по пагинации - завершаем парсинг")
+            current_page += 1
+            break
+
         current_page += 1
         smart_delay('page')
 
@@ -637,13 +913,14 @@ def parse_movie_details_and_schedule(movie_url):
         return [], None, [], None, None, None
 
     logger.debug(f"Получение расширенных деталей: {movie_url[:60]}...")
-    soup = get_soup(movie_url, request_type='detail')
+    tree = get_tree(movie_url, request_type='detail')
 
-    if not soup:
+    if tree is None:
         return [], None, [], None, None, None
 
     # Парсим страны
     countries = []
+    seen_countries = set()
     country_selectors = [
         '[data-test="ITEM-META"] a',
         '.country',
@@ -655,32 +932,72 @@ def parse_movie_details_and_schedule(movie_url):
     ]
 
     for selector in country_selectors:
-        country_elements = soup.select(selector)
+        country_elements = tree.cssselect(selector)
         for el in country_elements:
-            country_text = el.get_text(strip=True)
-            if country_text and len(country_text) < 50 and country_text not in countries:
+            country_text = element_text(el)
+            if country_text and len(country_text) < 50 and country_text not in seen_countries:
                 if not any(word in country_text.lower() for word in ['жанр', 'режиссер', 'актер', 'год', 'время']):
+                    seen_countries.add(country_text)
                     countries.append(country_text)
 
     # Парсим ближайшую дату сеансов из календаря
-    nearest_show_date = parse_schedule_calendar(soup)
+    nearest_show_date = parse_schedule_calendar(tree)
 
     # Парсим время сеансов
-    showtimes = parse_showtimes_from_page(soup)
+    showtimes = parse_showtimes_from_page(tree)
 
     # Парсим баннер фильма
-    banner_url = parse_movie_banner(soup)
+    banner_url = parse_movie_banner(tree)
 
     # Парсим описание фильма
-    description = parse_movie_description(soup)
+    description = parse_movie_description(tree)
 
     # Парсим возрастной рейтинг
-    age_rating = parse_age_rating(soup)
+    age_rating = parse_age_rating(tree)
 
     logger.debug(f"Парсинг завершен. Баннер: {'✅' if banner_url else '❌'}, Описание: {'✅' if description else '❌'}, Возраст: {'✅' if age_rating else '❌'}")
 
     return countries, nearest_show_date, showtimes, banner_url, description, age_rating
 
+def fetch_movie_details(movie_data):
+    """
+    Получить детали фильма в рабочем потоке, не прерывая обработку остальных фильмов
+    """
+    try:
+        return parse_movie_details_and_schedule(movie_data['url'])
+    except Exception as e:
+        logger.error(f"Ошибка при получении деталей фильма {movie_data['title']}: {e}")
+        return [], None, [], None, None, None
+
+def ics_escape(text):
+    """
+    Экранировать текстовое значение свойства iCalendar
+    """
+    return text.replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,').replace('\n', '\\n')
+
+def ics_event(title, begin, end, description=None, url=None):
+    """
+    Сформировать текст VEVENT без промежуточных объектов календаря
+    """
+    lines = ['BEGIN:VEVENT']
+    if description:
+        lines.append(f"DESCRIPTION:{ics_escape(description)}")
+    lines.append(f"DTEND:{end.strftime('%Y%m%dT%H%M%SZ')}")
+    lines.append(f"DTSTART:{begin.strftime('%Y%m%dT%H%M%SZ')}")
+    lines.append(f"SUMMARY:{ics_escape(title)}")
+    lines.append(f"UID:{uuid.uuid4()}@afisha-movie-calendar")
+    if url:
+        lines.append(f"URL:{url}")
+    lines.append('END:VEVENT')
+    return '\r\n'.join(lines) + '\r\n'
+
+def write_calendar(events, path='calendar.ics'):
+    """
+    Записать события в файл iCalendar одним вызовом write
+    """
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        f.write('BEGIN:VCALENDAR\r\nVERSION:2.0\r\nPRODID:-//Afisha Movie Calendar//RU\r\n' + ''.join(events) + 'END:VCALENDAR\r\n')
+
 def create_calendar_event(movie_data):
     """
     Создать КРАСИВОЕ событие календаря с эмоджи и расширенной информацией
@@ -720,13 +1037,6 @@ def create_calendar_event(movie_data):
     else:
         event_datetime = datetime.combine(event_date, datetime.min.time().replace(hour=19))
 
-    # Создание события
-    event = Event()
-    # Добавляем эмоджи хлопушки перед названием
-    event.name = f"🎬 {title}"
-    event.begin = event_datetime
-    event.end = event_datetime + timedelta(hours=2)
-
     # Создание КРАСИВОГО описания с эмоджи
     description_parts = []
 
@@ -775,9 +1085,14 @@ def create_calendar_event(movie_data):
         description_parts.append("")
         description_parts.append(f"🔗 Подробности: {movie_url}")
 
-    event.description = '\n'.join(description_parts)
-    if movie_url:
-        event.url = movie_url
+    # Создание события, эмоджи хлопушки перед названием
+    event = ics_event(
+        f"🎬 {title}",
+        event_datetime,
+        event_datetime + timedelta(hours=2),
+        '\n'.join(description_parts),
+        movie_url
+    )
 
     logger.info(f"Создано красивое событие: 🎬 {title} на {event_datetime.strftime('%d.%m.%Y %H:%M')}")
     return event
@@ -801,6 +1116,8 @@ def main():
 
     logger.info(f"Пропуск деталей: {'ДА (только основная информация)' if SKIP_DETAILS else 'НЕТ (ПОЛНАЯ информация: страны, баннер, описание, возраст)'}")
     logger.info(f"Базовая задержка: {BASE_DELAY} сек")
+    logger.info(f"Параллельных загрузок деталей: {DETAIL_WORKERS}")
+    logger.info(f"Кэш страниц фильмов: {f'{CACHE_DIR} ({CACHE_TTL_HOURS} ч)' if CACHE_TTL_HOURS else 'ОТКЛЮЧЕН'}")
     logger.info(f"Исключенные страны: {EXCLUDE_COUNTRIES}")
 
     base_schedule_url = 'https://www.afisha.ru/prm/schedule_cinema/'
@@ -811,76 +1128,88 @@ def main():
 
         if not all_movies_data:
             logger.error("Не найдено фильмов ни на одной странице")
-            cal = Calendar()
-            test_event = Event()
-            test_event.name = "🎬 Фильмы не найдены"
-            test_event.begin = datetime.now() + timedelta(days=1)
-            test_event.end = test_event.begin + timedelta(hours=2)
-            test_event.description = "Не удалось найти фильмы в расписании кинотеатров"
-            cal.events.add(test_event)
+            test_begin = datetime.now() + timedelta(days=1)
+            events = [ics_event(
+                "🎬 Фильмы не найдены",
+                test_begin,
+                test_begin + timedelta(hours=2),
+                "Не удалось найти фильмы в расписании кинотеатров"
+            )]
         else:
-            cal = Calendar()
+            events = []
             successful_events = 0
 
+            # Фильмы из исключенных стран (по данным карточек) отсеиваем до загрузки деталей
+            found_movies_count = len(all_movies_data)
+            all_movies_data = [
+                movie for movie in all_movies_data
+                if not any(country in EXCLUDE_COUNTRIES for country in movie['countries'])
+            ]
+            if len(all_movies_data) < found_movies_count:
+                logger.info(f"🚫 Пропущено {found_movies_count - len(all_movies_data)} фильмов из исключенных стран (по карточкам)")
+            if not all_movies_data:
+                logger.info("Все найденные фильмы из исключенных стран - календарь будет пустым")
+
             total_movies = len(all_movies_data)
             logger.info(f"🎯 Начинаем обработку {total_movies} найденных фильмов с РАСШИРЕННЫМИ деталями")
 
-            # Обработка каждого фильма с расширенной информацией
-            for idx, movie_data in enumerate(all_movies_data, 1):
-                try:
-                    logger.info(f"Обработка {idx}/{total_movies}: {movie_data['title']}")
-
-                    # Получаем РАСШИРЕННУЮ информацию
-                    if not SKIP_DETAILS and movie_data['url']:
-                        logger.debug(f"Получение расширенных деталей для фильма {idx}")
-                        countries, nearest_date, detailed_times, banner_url, description, age_rating = parse_movie_details_and_schedule(movie_data['url'])
-
-                        movie_data['countries'] = countries
-                        movie_data['nearest_show_date'] = nearest_date
-                        if not movie_data['banner_url'] and banner_url:
-                            movie_data['banner_url'] = banner_url
-                        movie_data['description'] = description
-                        movie_data['age_rating'] = age_rating
-
-                        # Дополняем время сеансов
-                        if detailed_times:
-                            all_times = list(set(movie_data['times'] + detailed_times))
-                            movie_data['times'] = sorted(all_times)
-                    else:
-                        if SKIP_DETAILS:
-                            logger.debug(f"Пропуск деталей для фильма {idx} (флаг --skip-details)")
-                        movie_data['countries'] = []
-                        movie_data['nearest_show_date'] = None
-                        movie_data['description'] = None
-                        movie_data['age_rating'] = None
-
-                    # Создаем КРАСИВОЕ событие календаря
-                    event = create_calendar_event(movie_data)
-
-                    if event:
-                        cal.events.add(event)
-                        successful_events += 1
-
-                    # Прогресс каждые 10 фильмов
-                    if idx % 10 == 0:
-                        logger.info(f"📊 Обработано {idx}/{total_movies} фильмов, создано {successful_events} событий")
-
-                    # Дополнительная задержка между фильмами
-                    if idx < total_movies:
-                        smart_delay('default')
-
-                except Exception as e:
-                    logger.error(f"Ошибка при обработке фильма {movie_data['title']}: {e}")
-                    continue
+            # Детали фильмов загружаются параллельно, события создаются по порядку
+            with ThreadPoolExecutor(max_workers=DETAIL_WORKERS) as executor:
+                if SKIP_DETAILS:
+                    details_results = [None] * total_movies
+                else:
+                    details_results = executor.map(fetch_movie_details, all_movies_data)
+
+                for idx, (movie_data, details) in enumerate(zip(all_movies_data, details_results), 1):
+                    try:
+                        logger.info(f"Обработка {idx}/{total_movies}: {movie_data['title']}")
+
+                        # Получаем РАСШИРЕННУЮ информацию
+                        if details and movie_data['url']:
+                            countries, nearest_date, detailed_times, banner_url, description, age_rating = details
+
+                            movie_data['countries'] = countries or movie_data['countries']
+                            movie_data['nearest_show_date'] = nearest_date
+                            if not movie_data['banner_url'] and banner_url:
+                                movie_data['banner_url'] = banner_url
+                            movie_data['description'] = description
+                            movie_data['age_rating'] = age_rating
+
+                            # Дополняем время сеансов
+                            if detailed_times:
+                                movie_data['times'] = [*movie_data['times'], *detailed_times]
+                        else:
+                            if SKIP_DETAILS:
+                                logger.debug(f"Пропуск деталей для фильма {idx} (флаг --skip-details)")
+                            movie_data['nearest_show_date'] = None
+                            movie_data['description'] = None
+                            movie_data['age_rating'] = None
+
+                        # Первым идет самый ранний сеанс - его время берется для события
+                        movie_data['times'] = sorted(set(movie_data['times']), key=showtime_sort_key)
+
+                        # Создаем КРАСИВОЕ событие календаря
+                        event = create_calendar_event(movie_data)
+
+                        if event:
+                            events.append(event)
+                            successful_events += 1
+
+                        # Прогресс каждые 10 фильмов
+                        if idx % 10 == 0:
+                            logger.info(f"📊 Обработано {idx}/{total_movies} фильмов, создано {successful_events} событий")
+
+                    except Exception as e:
+                        logger.error(f"Ошибка при обработке фильма {movie_data['title']}: {e}")
+                        continue
 
             logger.info(f"✅ ЗАВЕРШЕНО: обработано {total_movies} фильмов, создано {successful_events} красивых событий")
 
         # Сохранение результата
-        with open('calendar.ics', 'w', encoding='utf-8') as f:
-            f.writelines(cal)
+        write_calendar(events)
 
-        logger.info(f"📅 Календарь сохранен: calendar.ics ({len(cal.events)} событий)")
-        print(f"✅ Готово: сохранён calendar.ics ({len(cal.events)} событий)")
+        logger.info(f"📅 Календарь сохранен: calendar.ics ({len(events)} событий)")
+        print(f"✅ Готово: сохранён calendar.ics ({len(events)} событий)")
 
         if os.path.exists('calendar.ics'):
             file_size = os.path.getsize('calendar.ics')
@@ -888,16 +1217,13 @@ def main():
 
     except Exception as e:
         logger.error(f"Критическая ошибка: {e}")
-        cal = Calendar()
-        error_event = Event()
-        error_event.name = "🎬 Ошибка парсинга"
-        error_event.begin = datetime.now() + timedelta(days=1)
-        error_event.end = error_event.begin + timedelta(hours=2)
-        error_event.description = f"Произошла ошибка при парсинге: {str(e)}"
-        cal.events.add(error_event)
-
-        with open('calendar.ics', 'w', encoding='utf-8') as f:
-            f.writelines(cal)
+        error_begin = datetime.now() + timedelta(days=1)
+        write_calendar([ics_event(
+            "🎬 Ошибка парсинга",
+            error_begin,
+            error_begin + timedelta(hours=2),
+            f"Произошла ошибка при парсинге: {str(e)}"
+        )])
 
         raise
 